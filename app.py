@@ -1,9 +1,65 @@
-from flask import Flask, jsonify
+from flask import Flask, jsonify, request
 import sqlite3
+import uuid
 
 
 app = Flask(__name__)
 
+# Änderungsprotokoll für Rechnungen einrichten (Trigger schreiben jede Änderung mit Versionsnummer)
+def init_change_feed():
+    conn = sqlite3.connect('mock_db.db', isolation_level=None)
+    c = conn.cursor()
+    c.executescript("""
+        CREATE TABLE IF NOT EXISTS rechnungen_feed (
+            version INTEGER PRIMARY KEY AUTOINCREMENT,
+            rechnungsnummer TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS rechnungen_feed_meta (
+            feed_id TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_rechnungen_nummer ON rechnungen (rechnungsnummer);
+        CREATE TRIGGER IF NOT EXISTS rechnungen_feed_insert AFTER INSERT ON rechnungen
+        BEGIN
+            INSERT INTO rechnungen_feed (rechnungsnummer) VALUES (NEW.rechnungsnummer);
+        END;
+        CREATE TRIGGER IF NOT EXISTS rechnungen_feed_update AFTER UPDATE ON rechnungen
+        BEGIN
+            INSERT INTO rechnungen_feed (rechnungsnummer) VALUES (OLD.rechnungsnummer);
+            INSERT INTO rechnungen_feed (rechnungsnummer) VALUES (NEW.rechnungsnummer);
+        END;
+        CREATE TRIGGER IF NOT EXISTS rechnungen_feed_delete AFTER DELETE ON rechnungen
+        BEGIN
+            INSERT INTO rechnungen_feed (rechnungsnummer) VALUES (OLD.rechnungsnummer);
+        END;
+    """)
+    # Beim ersten Start den Bestand als Version 1..n übernehmen und dem Feed eine neue ID geben,
+    # damit Replikas einen neu angelegten Feed erkennen (BEGIN IMMEDIATE: nur ein Worker seedet)
+    c.execute("BEGIN IMMEDIATE")
+    c.execute("SELECT COUNT(*) FROM rechnungen_feed_meta")
+    if c.fetchone()[0] == 0:
+        c.execute("DELETE FROM rechnungen_feed")
+        c.execute("INSERT INTO rechnungen_feed (rechnungsnummer) SELECT rechnungsnummer FROM rechnungen")
+        c.execute("INSERT INTO rechnungen_feed_meta (feed_id) VALUES (?)", (uuid.uuid4().hex,))
+    c.execute("COMMIT")
+    conn.close()
+
+# Feed beim ersten Zugriff anlegen, egal ob per app.run, flask run oder gunicorn gestartet
+feed_bereit = False
+
+def feed_sicherstellen():
+    global feed_bereit
+    if not feed_bereit:
+        init_change_feed()
+        feed_bereit = True
+
+def aktuelle_version(c):
+    c.execute("SELECT COALESCE(MAX(version), 0) FROM rechnungen_feed")
+    return c.fetchone()[0]
+
+def aktuelle_feed_id(c):
+    c.execute("SELECT feed_id FROM rechnungen_feed_meta")
+    return c.fetchone()[0]
+
 # API-Endpunkt zum Abrufen der Rechnungsinformationen
 @app.route('/api/rechnung/<rechnungsnummer>', methods=['GET'])
 def get_rechnung(rechnungsnummer):
@@ -26,6 +82,55 @@ def get_rechnung(rechnungsnummer):
     else:
         return jsonify({"error": "Rechnung nicht gefunden"}), 404
 
+# Vollständiger Bestand für Replikas inkl. Version, ab der Deltas abgefragt werden können
+@app.route('/api/rechnungen/snapshot', methods=['GET'])
+def get_rechnungen_snapshot():
+    feed_sicherstellen()
+    conn = sqlite3.connect('mock_db.db')
+    c = conn.cursor()
+
+    # Version zuerst lesen: spätere Änderungen kommen spätestens mit dem nächsten Delta
+    feed_id = aktuelle_feed_id(c)
+    version = aktuelle_version(c)
+    c.execute("SELECT rechnungsnummer, betrag, status FROM rechnungen")
+    rechnungen = [
+        {"rechnungsnummer": r[0], "betrag": r[1], "status": r[2]}
+        for r in c.fetchall()
+    ]
+    conn.close()
+    return jsonify({"feed_id": feed_id, "version": version, "rechnungen": rechnungen})
+
+# Nur die seit einer Version geänderten Rechnungen (gelöschte mit "geloescht": true)
+@app.route('/api/rechnungen/delta', methods=['GET'])
+def get_rechnungen_delta():
+    try:
+        seit = int(request.args.get("seit", 0))
+    except ValueError:
+        return jsonify({"error": "Parameter 'seit' muss eine Zahl sein"}), 400
+
+    feed_sicherstellen()
+    conn = sqlite3.connect('mock_db.db')
+    c = conn.cursor()
+
+    feed_id = aktuelle_feed_id(c)
+    version = aktuelle_version(c)
+    c.execute(
+        """SELECT f.rechnungsnummer, r.betrag, r.status
+           FROM (SELECT DISTINCT rechnungsnummer FROM rechnungen_feed
+                 WHERE version > ? AND version <= ?) f
+           LEFT JOIN rechnungen r ON r.rechnungsnummer = f.rechnungsnummer""",
+        (seit, version),
+    )
+    aenderungen = []
+    for nummer, betrag, status in c.fetchall():
+        if status is None:
+            aenderungen.append({"rechnungsnummer": nummer, "geloescht": True})
+        else:
+            aenderungen.append({"rechnungsnummer": nummer, "betrag": betrag, "status": status})
+    conn.close()
+    return jsonify({"feed_id": feed_id, "version": version, "aenderungen": aenderungen})
+
 # API starten
+# Hinweis: der erste Aufruf von /api/rechnungen/* ändert das Schema von mock_db.db (Feed-Tabellen, Index, Trigger)
 if __name__ == '__main__':
     app.run(port=5001)
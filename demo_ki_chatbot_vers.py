@@ -1,14 +1,21 @@
 import os
 import re
+import sys
 import csv
 import json
+import hmac
+import random
 import string
+import sqlite3
+import time
+import threading
 import requests
 import spacy
 from fpdf import FPDF
+from contextlib import closing
 from datetime import datetime, timedelta
 from rapidfuzz import fuzz
-from flask import Flask, request, jsonify, send_file, render_template
+from flask import Flask, request, jsonify, send_file, render_template, g
 
 # ---------------------------
 # Konfiguration
@@ -18,6 +25,19 @@ print("DEBUG API_BASE:", API_BASE)  # hilft im Render-Log
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
+# Lokale Rechnungs-Replika: Sync-Intervall und maximales Alter, bevor remote gefragt wird
+RECHNUNGEN_SYNC_SEKUNDEN = int(os.environ.get("INVOICE_SYNC_INTERVAL", "60"))
+RECHNUNGEN_MAX_ALTER = timedelta(seconds=int(os.environ.get("INVOICE_MAX_STALE", str(5 * RECHNUNGEN_SYNC_SEKUNDEN))))
+
+# Sampling-Profiler: standardmäßig aus (Rate 0, kein Token)
+PROFILER_RATE = float(os.environ.get("PROFILER_SAMPLE_RATE", "0"))
+PROFILER_TOKEN = os.environ.get("PROFILER_TOKEN", "")
+PROFILER_INTERVALL = max(1, int(os.environ.get("PROFILER_INTERVAL_MS", "5"))) / 1000
+if PROFILER_RATE and not PROFILER_TOKEN:
+    # ohne Token wären /profiler/* nicht abrufbar – Sampling hätte nur Overhead
+    print("WARN PROFILER_SAMPLE_RATE ohne PROFILER_TOKEN gesetzt, Sampling bleibt aus.")
+    PROFILER_RATE = 0.0
+
 def load_nlp():
     """Lade eigenes spaCy-Modell; fallback auf de_core_news_sm (mit sicherem Download)."""
     try:
@@ -40,6 +60,9 @@ app.secret_key = "geheimeschluessel"
 os.makedirs("chat_logs", exist_ok=True)
 os.makedirs("pdf_rechnungen", exist_ok=True)
 os.makedirs("tickets", exist_ok=True)
+os.makedirs("analytics", exist_ok=True)
+
+TICKET_DATEI = "tickets/tickets.csv"
 
 # ---------------------------
 # Daten
@@ -268,11 +291,323 @@ def stimmung_anpassen(antwort, stimmung):
         antwort += " 😊 Vielen Dank für Ihre freundliche Anfrage."
     return antwort
 
+# ---------------------------
+# SQLite-Helfer
+# ---------------------------
+_sqlite_lokal = threading.local()
+
+def sqlite_init(pfad, schema):
+    """Schema und WAL-Modus einmalig beim Start anlegen."""
+    with closing(sqlite3.connect(pfad, timeout=5)) as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(schema)
+
+def sqlite_verbindung(pfad):
+    """Offene Verbindung je Datei, Prozess und Thread; nach dem fork eines Workers neu aufbauen."""
+    if getattr(_sqlite_lokal, "pid", None) != os.getpid():
+        _sqlite_lokal.pid = os.getpid()
+        _sqlite_lokal.verbindungen = {}
+    conn = _sqlite_lokal.verbindungen.get(pfad)
+    if conn is None:
+        conn = _sqlite_lokal.verbindungen[pfad] = sqlite3.connect(pfad, timeout=5)
+    return conn
+
+# ---------------------------
+# Hintergrund-Threads
+# ---------------------------
+_thread_pids = {}
+_thread_lock = threading.Lock()
+
+def starte_hintergrund_thread(name, ziel):
+    """Daemon-Thread einmal pro Prozess starten; Threads überleben den fork der gunicorn-Worker nicht."""
+    if _thread_pids.get(name) == os.getpid():
+        return
+    with _thread_lock:
+        if _thread_pids.get(name) == os.getpid():
+            return
+        _thread_pids[name] = os.getpid()
+    threading.Thread(target=ziel, name=name, daemon=True).start()
+
+# ---------------------------
+# Rechnungen (lokale Replika von app.py)
+# ---------------------------
+# Wird nur komplett ersetzt, nie verändert: Leser in chat() brauchen kein Lock
+rechnungen_replika = {"feed_id": None, "version": None, "daten": {}, "stand": None}
+_replika_lock = threading.Lock()
+
+def replika_sync():
+    """Snapshot beim ersten Mal, danach nur Deltas seit der letzten Version übernehmen."""
+    global rechnungen_replika
+    if not API_BASE:
+        return
+    with _replika_lock:
+        alt = rechnungen_replika
+        d = None
+        if alt["version"] is not None:
+            response = requests.get(f"{API_BASE}/api/rechnungen/delta", params={"seit": alt["version"]}, timeout=10)
+            response.raise_for_status()
+            d = response.json()
+            if d.get("feed_id") != alt["feed_id"]:
+                # anderer Feed auf dem Server (DB ersetzt oder neu angelegt): neuen Snapshot holen
+                d = None
+            else:
+                daten = dict(alt["daten"])
+                for r in d["aenderungen"]:
+                    if r.get("geloescht"):
+                        daten.pop(r["rechnungsnummer"], None)
+                    else:
+                        daten[r["rechnungsnummer"]] = r
+        if d is None:
+            response = requests.get(f"{API_BASE}/api/rechnungen/snapshot", timeout=10)
+            response.raise_for_status()
+            d = response.json()
+            daten = {r["rechnungsnummer"]: r for r in d["rechnungen"]}
+        rechnungen_replika = {"feed_id": d.get("feed_id"), "version": d["version"], "daten": daten, "stand": datetime.now()}
+
+def _replika_schleife():
+    while True:
+        try:
+            replika_sync()
+        except Exception as e:
+            print("WARN replika_sync:", e)
+        time.sleep(RECHNUNGEN_SYNC_SEKUNDEN)
+
+def hole_rechnung(rechnungsnummer):
+    """Rechnung aus der Replika; bei Miss oder veralteter Replika per HTTP von app.py. None = nicht gefunden."""
+    if API_BASE:
+        starte_hintergrund_thread("replika_sync", _replika_schleife)
+    replika = rechnungen_replika
+    aktuell = replika["stand"] is not None and datetime.now() - replika["stand"] <= RECHNUNGEN_MAX_ALTER
+    if aktuell and rechnungsnummer in replika["daten"]:
+        return replika["daten"][rechnungsnummer]
+
+    if not API_BASE:
+        raise RuntimeError("INVOICE_API_URL ist nicht gesetzt.")
+    api_url = f"{API_BASE}/api/rechnung/{rechnungsnummer}"
+    response = requests.get(api_url, timeout=10)
+    if response.status_code == 200:
+        return response.json()
+    return None
+
+# ---------------------------
+# Analytics (inkrementelle Rollups)
+# ---------------------------
+ANALYTICS_DB = "analytics/rollups.db"
+
+ROLLUP_UPSERT = (
+    "INSERT INTO rollups (tag, metrik, schluessel, wert) VALUES (?, ?, ?, ?) "
+    "ON CONFLICT(tag, metrik, schluessel) DO UPDATE SET wert = wert + excluded.wert"
+)
+
+def _ticket_tag(ticket_id):
+    """Ticket-ID (YYYYMMDD-HHMMSS) -> Erstellungstag als YYYY-MM-DD."""
+    try:
+        return datetime.strptime(ticket_id[:8], "%Y%m%d").strftime("%Y-%m-%d")
+    except (TypeError, ValueError):
+        return datetime.now().strftime("%Y-%m-%d")
+
+def _seed_ticket_rollups(conn):
+    """Bestehende tickets.csv einmalig übernehmen (atomar über meta, auch bei mehreren Workern)."""
+    cur = conn.execute("INSERT OR IGNORE INTO meta (schluessel) VALUES ('tickets_seeded')")
+    if cur.rowcount == 0 or not os.path.exists(TICKET_DATEI):
+        return
+    with open(TICKET_DATEI, mode="r", encoding="utf-8") as file:
+        conn.executemany(
+            ROLLUP_UPSERT,
+            [(_ticket_tag(t.get("Ticket-ID")), "tickets", t.get("Status") or "Offen", 1) for t in csv.DictReader(file)],
+        )
+
+def analytics_init():
+    # SQLite statt Prozess-Speicher: alle gunicorn-Worker zählen in dieselbe Datei
+    try:
+        sqlite_init(ANALYTICS_DB, """
+            CREATE TABLE IF NOT EXISTS rollups (
+                tag TEXT NOT NULL,
+                metrik TEXT NOT NULL,
+                schluessel TEXT NOT NULL DEFAULT '',
+                wert REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (tag, metrik, schluessel)
+            );
+            CREATE TABLE IF NOT EXISTS meta (schluessel TEXT PRIMARY KEY);
+        """)
+        with closing(sqlite3.connect(ANALYTICS_DB, timeout=5)) as conn, conn:
+            _seed_ticket_rollups(conn)
+    except Exception as e:
+        print("WARN analytics_init:", e)
+
+def analytics_nachricht(absicht, stimmung, zweig, latenz_ms):
+    """Zähler für eine beantwortete Nachricht fortschreiben."""
+    tag = datetime.now().strftime("%Y-%m-%d")
+    try:
+        with sqlite_verbindung(ANALYTICS_DB) as conn:
+            conn.executemany(ROLLUP_UPSERT, [
+                (tag, "nachrichten", "", 1),
+                (tag, "absicht", absicht or "keine", 1),
+                (tag, "stimmung", stimmung or "neutral", 1),
+                (tag, "zweig", zweig, 1),
+                (tag, "latenz_ms_summe", "", latenz_ms),
+            ])
+    except Exception as e:
+        print("WARN analytics_nachricht:", e)
+
+def analytics_ticket(ticket_id, alter_status, neuer_status):
+    """Offen/Erledigt-Zähler pflegen; gezählt wird am Erstellungstag des Tickets."""
+    tag = _ticket_tag(ticket_id)
+    zeilen = [(tag, "tickets", neuer_status, 1)]
+    if alter_status:
+        zeilen.append((tag, "tickets", alter_status, -1))
+    try:
+        with sqlite_verbindung(ANALYTICS_DB) as conn:
+            conn.executemany(ROLLUP_UPSERT, zeilen)
+    except Exception as e:
+        print("WARN analytics_ticket:", e)
+
+def analytics_abfrage(von=None, bis=None):
+    """Summen über einen Tagesbereich (YYYY-MM-DD, inklusive) aus den Rollups lesen."""
+    with sqlite_verbindung(ANALYTICS_DB) as conn:
+        zeilen = conn.execute(
+            "SELECT tag, metrik, schluessel, SUM(wert) FROM rollups "
+            "WHERE tag BETWEEN ? AND ? GROUP BY tag, metrik, schluessel",
+            (von or "0000-00-00", bis or "9999-99-99"),
+        ).fetchall()
+
+    tage = {}
+    gesamt = {}
+    for tag, metrik, schluessel, wert in zeilen:
+        for ziel in (tage.setdefault(tag, {}), gesamt):
+            if schluessel:
+                bucket = ziel.setdefault(metrik, {})
+                bucket[schluessel] = bucket.get(schluessel, 0) + wert
+            else:
+                ziel[metrik] = ziel.get(metrik, 0) + wert
+
+    def kennzahlen(d):
+        nachrichten = d.get("nachrichten", 0)
+        tickets = d.get("tickets", {})
+        return {
+            "nachrichten": int(nachrichten),
+            "absichten": {k: int(v) for k, v in d.get("absicht", {}).items()},
+            "stimmungen": {k: int(v) for k, v in d.get("stimmung", {}).items()},
+            "faq_quote": round(d.get("zweig", {}).get("faq", 0) / nachrichten, 4) if nachrichten else 0.0,
+            "eskalations_quote": round(d.get("zweig", {}).get("ticket", 0) / nachrichten, 4) if nachrichten else 0.0,
+            "latenz_ms_avg": round(d.get("latenz_ms_summe", 0) / nachrichten, 1) if nachrichten else 0.0,
+            "tickets_offen": int(tickets.get("Offen", 0)),
+            "tickets_erledigt": int(tickets.get("Erledigt", 0)),
+        }
+
+    # ohne Angabe den tatsächlich vorhandenen Bereich melden (None, wenn leer)
+    return {
+        "von": von or min(tage, default=None),
+        "bis": bis or max(tage, default=None),
+        "gesamt": kennzahlen(gesamt),
+        "tage": {tag: kennzahlen(tage[tag]) for tag in sorted(tage)},
+    }
+
+analytics_init()
+
+# ---------------------------
+# Profiler (Sampling, opt-in)
+# ---------------------------
+PROFILER_DB = "analytics/profile.db"
+
+_profil_aktiv = {}  # Thread-ID -> {collapsed stack: samples}
+_profil_lock = threading.Lock()
+_profil_event = threading.Event()
+
+def profiler_init():
+    # eine Datei für alle Worker, damit /profiler/* alle Prozesse zusammenfasst
+    try:
+        sqlite_init(PROFILER_DB, """
+            CREATE TABLE IF NOT EXISTS profil_stacks (
+                route TEXT NOT NULL,
+                absicht TEXT NOT NULL,
+                stack TEXT NOT NULL,
+                samples INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (route, absicht, stack)
+            );
+        """)
+    except Exception as e:
+        print("WARN profiler_init:", e)
+
+def _profiler_schleife():
+    """Stacks aller gerade profilierten Request-Threads in festem Intervall abtasten."""
+    while True:
+        _profil_event.wait()
+        time.sleep(PROFILER_INTERVALL)
+        frames = sys._current_frames()
+        with _profil_lock:
+            for ident, stacks in _profil_aktiv.items():
+                frame = frames.get(ident)
+                teile = []
+                while frame is not None:
+                    code = frame.f_code
+                    # Modul + qualifizierter Name, damit gleichnamige Dateien/Funktionen nicht verschmelzen
+                    modul = frame.f_globals.get("__name__", "?")
+                    teile.append(f"{modul}:{getattr(code, 'co_qualname', code.co_name)}")
+                    frame = frame.f_back
+                if teile:
+                    stack = ";".join(reversed(teile))
+                    stacks[stack] = stacks.get(stack, 0) + 1
+            if not _profil_aktiv:
+                _profil_event.clear()
+
+def _profiler_berechtigt():
+    token = request.headers.get("X-Profiler-Token", "")
+    return bool(PROFILER_TOKEN) and hmac.compare_digest(token.encode(), PROFILER_TOKEN.encode())
+
+@app.before_request
+def profiler_start():
+    if not PROFILER_RATE and not PROFILER_TOKEN:
+        return
+    if request.path.startswith("/profiler"):
+        return
+    if random.random() < PROFILER_RATE or ("X-Profiler-Token" in request.headers and _profiler_berechtigt()):
+        starte_hintergrund_thread("profiler", _profiler_schleife)
+        with _profil_lock:
+            _profil_aktiv[threading.get_ident()] = {}
+            _profil_event.set()
+        g.profil = True
+
+@app.teardown_request
+def profiler_stop(exc=None):
+    if not g.get("profil"):
+        return
+    with _profil_lock:
+        stacks = _profil_aktiv.pop(threading.get_ident(), {})
+    if not stacks:
+        return
+    route = request.url_rule.rule if request.url_rule else request.path
+    absicht = g.get("profil_absicht") or "-"
+    try:
+        with sqlite_verbindung(PROFILER_DB) as conn:
+            conn.executemany(
+                "INSERT INTO profil_stacks (route, absicht, stack, samples) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(route, absicht, stack) DO UPDATE SET samples = samples + excluded.samples",
+                [(route, absicht, stack, n) for stack, n in stacks.items()],
+            )
+    except Exception as e:
+        print("WARN profiler_stop:", e)
+
+def profiler_abfrage():
+    """Gespeicherte Stacks, optional gefiltert über ?route=...&absicht=..."""
+    sql = "SELECT route, absicht, stack, SUM(samples) FROM profil_stacks WHERE 1=1"
+    params = []
+    for feld in ("route", "absicht"):
+        if request.args.get(feld):
+            sql += f" AND {feld} = ?"
+            params.append(request.args[feld])
+    sql += " GROUP BY route, absicht, stack"
+    with sqlite_verbindung(PROFILER_DB) as conn:
+        return conn.execute(sql, params).fetchall()
+
+if PROFILER_RATE or PROFILER_TOKEN:
+    profiler_init()
+
 # ---------------------------
 # Speichern & Antworten
 # ---------------------------
 
-def speichere_chat(user_text, bot_text):
+def speichere_chat(user_text, bot_text, meta=None):
     heute = datetime.now().strftime("%Y%m%d")
     dateiname = f"chat_logs/chat_{heute}.json"
 
@@ -281,6 +616,9 @@ def speichere_chat(user_text, bot_text):
         "sender": "Benutzer",
         "nachricht": user_text,
     }
+    if meta:
+        # strukturierte Felder (absicht, stimmung, zweig, latenz_ms) am Benutzereintrag
+        eintrag_user.update(meta)
 
     eintrag_bot = {
         "zeit": datetime.now().strftime("%d.%m.%Y %H:%M"),
@@ -302,11 +640,16 @@ def speichere_chat(user_text, bot_text):
     with open(dateiname, "w", encoding="utf-8") as f:
         json.dump(daten, f, indent=4, ensure_ascii=False)
 
-def send_response(benutzertext, antwort, stimmung=None):
-    """Zentraler Hook: Empathie hier anwenden, dann speichern & senden."""
+def send_response(benutzertext, antwort, stimmung=None, zweig="intent", absicht=None):
+    """Zentraler Hook: Empathie hier anwenden, dann speichern, zählen & senden."""
     if stimmung is not None:
         antwort = stimmung_anpassen(antwort, stimmung)
-    speichere_chat(benutzertext, antwort)
+    start = g.get("chat_start")
+    latenz_ms = round((time.perf_counter() - start) * 1000, 1) if start else 0.0
+    meta = {"absicht": absicht, "stimmung": stimmung, "zweig": zweig, "latenz_ms": latenz_ms}
+    g.profil_absicht = absicht or zweig
+    speichere_chat(benutzertext, antwort, meta)
+    analytics_nachricht(absicht, stimmung, zweig, latenz_ms)
     return jsonify({"antwort": antwort})
 
 # ---------------------------
@@ -318,18 +661,20 @@ def ticket_erstellen(benutzertext, absicht):
         os.makedirs('tickets', exist_ok=True)
         ticket_id = datetime.now().strftime("%Y%m%d-%H%M%S")
         timestamp = datetime.now().strftime("%d.%m.%Y %H:%M")
-        ticket_datei = "tickets/tickets.csv"
+        ticket_datei = TICKET_DATEI
         neu = not os.path.exists(ticket_datei)
         with open(ticket_datei, mode='a', newline='', encoding='utf-8') as file:
             writer = csv.writer(file)
             if neu:
                 writer.writerow(["Ticket-ID", "Zeit", "Absicht", "Anfrage", "Status"])
             writer.writerow([ticket_id, timestamp, absicht, benutzertext, "Offen"])
+        analytics_ticket(ticket_id, None, "Offen")
     except Exception as e:
         print("WARN ticket_erstellen:", e)
 
 @app.route("/chat", methods=["POST"])
 def chat():
+    g.chat_start = time.perf_counter()
     daten = request.get_json()
     benutzertext = (daten.get("nachricht") or "").strip()
     user_id = daten.get("user_id", "default")
@@ -356,29 +701,25 @@ def chat():
     lt = benutzertext.lower()
     if "sprache englisch" in lt or "language english" in lt:
         benutzer_status[user_id]["sprache"] = "en"
-        return send_response(benutzertext, "✅ Language switched to English. How can I assist you?", stimmung)
+        return send_response(benutzertext, "✅ Language switched to English. How can I assist you?", stimmung, zweig="sprache")
 
     if "sprache deutsch" in lt or "language german" in lt:
         benutzer_status[user_id]["sprache"] = "de"
-        return send_response(benutzertext, "✅ Sprache auf Deutsch gewechselt. Wie kann ich Ihnen helfen?", stimmung)
+        return send_response(benutzertext, "✅ Sprache auf Deutsch gewechselt. Wie kann ich Ihnen helfen?", stimmung, zweig="sprache")
 
     # FAQ
     faq_antwort = finde_aehnliche_frage(benutzertext)
     if faq_antwort:
         text = "Gerne. " + faq_antwort[benutzer_status[user_id]["sprache"]]
-        return send_response(benutzertext, text, stimmung)
+        return send_response(benutzertext, text, stimmung, zweig="faq")
 
     # PDF-Download
     if "herunterladen" in lt and "rechnung" in lt:
         if entities["rechnungsnummer"]:
             rechnungsnummer = entities["rechnungsnummer"][0]
             try:
-                if not API_BASE:
-                    raise RuntimeError("INVOICE_API_URL ist nicht gesetzt.")
-                api_url = f"{API_BASE}/api/rechnung/{rechnungsnummer}"
-                response = requests.get(api_url, timeout=10)
-                if response.status_code == 200:
-                    d = response.json()
+                d = hole_rechnung(rechnungsnummer)
+                if d:
                     dateiname = erstelle_pdf_rechnung(d["rechnungsnummer"], d["betrag"], d["status"])
                     antwort = {
                         "de": f"✅ Ihre PDF-Rechnung ist bereit: [Hier herunterladen](/download/{os.path.basename(dateiname)})",
@@ -393,18 +734,14 @@ def chat():
                 "de": "❗ Bitte geben Sie die Rechnungsnummer an, die Sie herunterladen möchten.",
                 "en": "❗ Please provide the invoice number you want to download.",
             }[benutzer_status[user_id]["sprache"]]
-        return send_response(benutzertext, antwort, stimmung)
+        return send_response(benutzertext, antwort, stimmung, zweig="pdf_download")
 
     # Rechnungsauskunft, wenn Nummer im Text
     if entities["rechnungsnummer"]:
         rechnungsnummer = entities["rechnungsnummer"][0]
         try:
-            if not API_BASE:
-                raise RuntimeError("INVOICE_API_URL ist nicht gesetzt.")
-            api_url = f"{API_BASE}/api/rechnung/{rechnungsnummer}"
-            response = requests.get(api_url, timeout=10)
-            if response.status_code == 200:
-                d = response.json()
+            d = hole_rechnung(rechnungsnummer)
+            if d:
                 antwort = {
                     "de": f"📄 Rechnung {d.get('rechnungsnummer', 'N/A')}: Betrag: {d.get('betrag', 'N/A')}€, Status: {d.get('status', 'N/A')}",
                     "en": f"📄 Invoice {d.get('rechnungsnummer', 'N/A')}: Amount: {d.get('betrag', 'N/A')}€, Status: {d.get('status', 'N/A')}",
@@ -413,7 +750,7 @@ def chat():
                 antwort = "❗ Die Rechnung wurde nicht gefunden."
         except Exception:
             antwort = "❗ Fehler beim Abrufen der Rechnungsdaten."
-        return send_response(benutzertext, antwort, stimmung)
+        return send_response(benutzertext, antwort, stimmung, zweig="rechnungsauskunft")
 
     # ---------------------------
     # Zustandsmaschine: Ratenzahlung
@@ -458,7 +795,7 @@ def chat():
                 "de": "❗ Bitte geben Sie eine gültige Monatsrate in Euro an.",
                 "en": "❗ Please provide a valid monthly amount in Euros.",
             }[benutzer_status[user_id]["sprache"]]
-        return send_response(benutzertext, antwort, stimmung)
+        return send_response(benutzertext, antwort, stimmung, zweig="ratenplan")
 
     if status["status"] == "warte_auf_vorschlagsrate":
         betraege = entities.get("betrag", [])
@@ -498,12 +835,13 @@ def chat():
                 "de": "❗ Bitte geben Sie eine gültige Zahl an (z. B. 30, 40, 50).",
                 "en": "❗ Please enter a valid number (e.g., 30, 40, 50).",
             }[benutzer_status[user_id]["sprache"]]
-        return send_response(benutzertext, antwort, stimmung)
+        return send_response(benutzertext, antwort, stimmung, zweig="ratenplan")
 
     # ---------------------------
     # Standard Intent-Handling
     # ---------------------------
     absicht = verstehe_absicht(benutzertext)
+    zweig = "intent"
 
     if absicht == "rechnung_abfragen":
         antwort = {
@@ -531,6 +869,7 @@ def chat():
             "en": "📞 Your request has been forwarded to our team. You will receive a response soon.",
         }[benutzer_status[user_id]["sprache"]]
         ticket_erstellen(benutzertext, absicht)
+        zweig = "ticket"
 
     elif absicht == "punkte_abfragen":
         antwort = {
@@ -569,7 +908,7 @@ def chat():
             "en": "❓ I didn't quite understand your request.",
         }[benutzer_status[user_id]["sprache"]]
 
-    return send_response(benutzertext, antwort, stimmung)
+    return send_response(benutzertext, antwort, stimmung, zweig=zweig, absicht=absicht)
 
 @app.route("/download/<path:filename>")
 def download_file(filename):
@@ -585,13 +924,31 @@ def index():
 
 @app.route("/tickets")
 def tickets_dashboard():
-    ticket_datei = "tickets/tickets.csv"
+    ticket_datei = TICKET_DATEI
     tickets = []
     if os.path.exists(ticket_datei):
         with open(ticket_datei, mode="r", encoding="utf-8") as file:
             reader = csv.DictReader(file)
             tickets = list(reader)
-    return render_template("tickets.html", tickets=tickets)
+    try:
+        kennzahlen = analytics_abfrage()["gesamt"]
+    except Exception as e:
+        print("WARN analytics_abfrage:", e)
+        kennzahlen = None
+    return render_template("tickets.html", tickets=tickets, kennzahlen=kennzahlen)
+
+@app.route("/analytics")
+def analytics():
+    """Kennzahlen aus den Rollups, z. B. /analytics?von=2025-01-01&bis=2025-01-31"""
+    von = request.args.get("von")
+    bis = request.args.get("bis")
+    for wert in (von, bis):
+        if wert:
+            try:
+                datetime.strptime(wert, "%Y-%m-%d")
+            except ValueError:
+                return jsonify({"error": "Datum bitte als YYYY-MM-DD angeben."}), 400
+    return jsonify(analytics_abfrage(von, bis))
 
 @app.route("/update_ticket", methods=["POST"])
 def update_ticket():
@@ -601,7 +958,7 @@ def update_ticket():
     if not ticket_id:
         return jsonify({"success": False, "message": "Ticket-ID fehlt."}), 400
 
-    ticket_datei = "tickets/tickets.csv"
+    ticket_datei = TICKET_DATEI
     tickets = []
 
     if os.path.exists(ticket_datei):
@@ -612,6 +969,7 @@ def update_ticket():
     updated = False
     for ticket in tickets:
         if ticket["Ticket-ID"] == ticket_id:
+            alter_status = ticket["Status"]
             ticket["Status"] = "Erledigt"
             updated = True
             break
@@ -622,13 +980,15 @@ def update_ticket():
             writer = csv.DictWriter(file, fieldnames=fieldnames)
             writer.writeheader()
             writer.writerows(tickets)
+        if alter_status != "Erledigt":
+            analytics_ticket(ticket_id, alter_status, "Erledigt")
         return jsonify({"success": True})
     else:
         return jsonify({"success": False, "message": "Ticket nicht gefunden."}), 404
 
 @app.route("/download_tickets")
 def download_tickets():
-    ticket_datei = "tickets/tickets.csv"
+    ticket_datei = TICKET_DATEI
     if os.path.exists(ticket_datei):
         return send_file(ticket_datei, as_attachment=True)
     else:
@@ -673,6 +1033,43 @@ def download_chatlog(filename):
     else:
         return "Datei nicht gefunden.", 404
 
+@app.route("/profiler/stacks")
+def profiler_stacks():
+    """Collapsed Stacks (route;absicht;frame;... samples) für flamegraph.pl / speedscope."""
+    if not _profiler_berechtigt():
+        return "Nicht gefunden.", 404
+    zeilen = [f"{route};{absicht};{stack} {n}" for route, absicht, stack, n in profiler_abfrage()]
+    return "\n".join(zeilen) + "\n", 200, {"Content-Type": "text/plain; charset=utf-8"}
+
+@app.route("/profiler/top")
+def profiler_top():
+    """Top-N Funktionen nach Self- und Gesamt-Samples."""
+    if not _profiler_berechtigt():
+        return "Nicht gefunden.", 404
+    n = max(1, request.args.get("n", 20, type=int))
+    selbst = {}
+    gesamt = {}
+    summe = 0
+    for _route, _absicht, stack, samples in profiler_abfrage():
+        frames = stack.split(";")
+        summe += samples
+        selbst[frames[-1]] = selbst.get(frames[-1], 0) + samples
+        for frame in set(frames):
+            gesamt[frame] = gesamt.get(frame, 0) + samples
+
+    def top(d):
+        return [{"funktion": f, "samples": s} for f, s in sorted(d.items(), key=lambda x: -x[1])[:n]]
+
+    return jsonify({"samples": summe, "selbst": top(selbst), "gesamt": top(gesamt)})
+
+@app.route("/profiler/reset", methods=["POST"])
+def profiler_reset():
+    if not _profiler_berechtigt():
+        return "Nicht gefunden.", 404
+    with sqlite_verbindung(PROFILER_DB) as conn:
+        conn.execute("DELETE FROM profil_stacks")
+    return jsonify({"success": True})
+
 # ---------------------------
 # Main
 # ---------------------------